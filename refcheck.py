@@ -12,11 +12,24 @@
 # 3. OpenAlex is picky about the symbols in the title. : is a no go as well as , but should
 #    they be ignored or replaced by a space. I found you need to keep the . :)
 
+import csv
+import hashlib
+import io
+import json
 import logging
 import os
+import queue
+import sys
+import tarfile
+import threading
+import time
 import unicodedata
-from collections import namedtuple
+import zipfile
+from collections import namedtuple, OrderedDict
 from datetime import datetime
+from enum import Enum
+from functools import cached_property
+from urllib.parse import urlsplit
 
 import arxiv
 import click
@@ -32,6 +45,7 @@ import fitz  # PyMuPDF
 import re
 import requests
 import enchant
+from urllib3.exceptions import NewConnectionError
 
 DOI_ORG_PREFIX = "https://doi.org/"
 
@@ -39,6 +53,8 @@ DOI_ORG_API = "https://doi.org/api/handles/"
 
 URL_PATTERN = re.compile(r'https?:(//\S*)? ?$')
 
+DOI_PATTERN = re.compile(r'10\.\d{4,9}/[-._;()/:A-Z0-9]+', flags=re.IGNORECASE)
+
 WORDS = enchant.Dict("en_US")
 
 
@@ -144,8 +160,9 @@ def bb_touching(prev_bb, bb):
     return prev_x_right + 0.5 > bb_x_left
 
 
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
+# pdf can be a path or the bytes of a PDF we got from an archive or a pipe
+def extract_text_from_pdf(pdf):
+    doc = fitz.open(stream=pdf, filetype="pdf") if isinstance(pdf, (bytes, bytearray)) else fitz.open(pdf)
     text = ''
 
     for page in doc:
@@ -169,7 +186,7 @@ def extract_text_from_pdf(pdf_path):
         yield text
 
 
-def extract_references(text_lines):
+def extract_references(text_lines, words=WORDS):
     # Roughly extract references section
     for line in text_lines:
         references_section = re.search(r'(references|bibliography)\s*$', line.strip(), flags=re.IGNORECASE)
@@ -194,20 +211,20 @@ def extract_references(text_lines):
             else:
                 # fix any hyphenated lines
                 if ref.endswith("-"):
-                    ref = decide_on_hyphen(ref, line)
+                    ref = decide_on_hyphen(ref, line, words)
                 else:
                     ref += " " + line
     if ref:
         yield fix_accents(ref)
 
 
-def check_dictionary(word):
+def check_dictionary(word, words=WORDS):
     # super big hack. words like gaussian are only valid if capitalized, and AI
     # is in the dictionary but authors who don't know how to do bibliographies often get AI rendered as Ai
-    return WORDS.check(word) or WORDS.check(word.upper())
+    return words.check(word) or words.check(word.upper())
 
 
-def decide_on_hyphen(ref, line):
+def decide_on_hyphen(ref, line, words=WORDS):
     # get the last word from ref and the first word from line
     first_word_match = re.search(r'(\w+)-$', ref)
     first_word = first_word_match.group(1) if first_word_match else None
@@ -221,10 +238,10 @@ def decide_on_hyphen(ref, line):
         # these aren't words so preserve the hyphen or
         # if the last word is capitalized (probably a name) preserve the hyphen
         ref = ref + line
-    elif check_dictionary(first_word + last_word):
+    elif check_dictionary(first_word + last_word, words):
         # if the first and last words are a valid word, remove hyphen
         ref = ref[:-1] + line
-    elif check_dictionary(first_word) and check_dictionary(last_word):
+    elif check_dictionary(first_word, words) and check_dictionary(last_word, words):
         # keep the hyphen between two valid words
         ref = ref + line
     else:
@@ -240,27 +257,211 @@ def decide_on_hyphen(ref, line):
 
 def find_urls_or_dois(ref):
     urls = re.findall(r'https?://\S+', ref)
-    dois = re.findall(r'10\.\d{4,9}/[-._;()/:A-Z0-9]+', ref, flags=re.IGNORECASE)
+    dois = DOI_PATTERN.findall(ref)
     # The DOI search doesn't seem to work properly
     dois = []
     # Remove trailing periods from URLs
     return [url.rstrip('.').rstrip(',') for url in urls + ["https://doi.org/" + doi for doi in dois]]
 
 
-def check_url_validity(url):
+class LinkVerdict(Enum):
+    VALID = "valid"
+    INVALID = "invalid"
+    HOST_UNREACHABLE = "host unreachable"
+
+
+HOST_FAILURE_THRESHOLD = 3
+HOST_RETRY_SECONDS = 60
+
+
+# Keeps track of hosts that we can't connect to (DNS failures, connect timeouts, TLS errors)
+# during a run. once a host has failed threshold times in a row, its circuit opens and we
+# stop trying it. after retry_seconds we let a single probe through to see if it came back.
+class HostHealth:
+    def __init__(self, threshold=HOST_FAILURE_THRESHOLD, retry_seconds=HOST_RETRY_SECONDS):
+        self.threshold = threshold
+        self.retry_seconds = retry_seconds
+        self.failures = {}
+        self.opened_at = {}
+        self.probing = set()
+        self.lock = threading.Lock()
+
+    def allow(self, host):
+        with self.lock:
+            if host not in self.opened_at:
+                return True
+            if host in self.probing or time.monotonic() - self.opened_at[host] < self.retry_seconds:
+                return False
+            # half open: this request gets to find out if the host is back
+            self.probing.add(host)
+            return True
+
+    def record_success(self, host):
+        with self.lock:
+            self.failures.pop(host, None)
+            self.opened_at.pop(host, None)
+            self.probing.discard(host)
+
+    def release(self, host):
+        # whatever happened, this host's probe (if this was one) is over
+        with self.lock:
+            self.probing.discard(host)
+
+    def record_failure(self, host):
+        with self.lock:
+            self.failures[host] = self.failures.get(host, 0) + 1
+            if host in self.probing or self.failures[host] >= self.threshold:
+                if host not in self.opened_at:
+                    logging.debug(f"{host} failed {self.failures[host]} times, giving up on it for now")
+                self.opened_at[host] = time.monotonic()
+            self.probing.discard(host)
+
+
+# we only care about the status code, so we never want to pull down the (possibly huge) body
+LINK_CONNECT_TIMEOUT = 5
+LINK_READ_TIMEOUT = 10
+LINK_MAX_REDIRECTS = 10
+
+
+def link_is_good(status_code):
+    # we are going to take 403 as meaning that it could be there...
+    return status_code < 400 or status_code == 403
+
+
+def make_link_session():
+    session = requests.Session()
+    session.max_redirects = LINK_MAX_REDIRECTS
+    return session
+
+
+def header_bytes(response):
+    # a rough count of what came over the wire for a response we didn't read the body of
+    return len(response.reason or '') + 13 + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+
+
+def could_not_connect(ex):
+    # DNS failures, refused connections, connect timeouts, and TLS errors mean we never got to
+    # talk to the host. other connection errors (like the host hanging up on us) mean we did.
+    if isinstance(ex, (requests.exceptions.ConnectTimeout, requests.exceptions.SSLError)):
+        return True
+    reason = getattr(ex.args[0], 'reason', None) if ex.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def probe_url(url, session):
+    # returns the final response and an estimate of the bytes transferred to get it.
+    # HEAD first, but plenty of servers reject or mishandle HEAD, so if it doesn't give us a
+    # good answer we fall back to a GET that we close as soon as the headers arrive.
+    timeout = (LINK_CONNECT_TIMEOUT, LINK_READ_TIMEOUT)
+    transferred = 0
     try:
-        if url.startswith(DOI_ORG_PREFIX):
-            url = DOI_ORG_API + url[len(DOI_ORG_PREFIX):]
-        response = requests.get(url, allow_redirects=True, timeout=10)
-        logging.debug(f"Checking URL: {url} returned status code: {response.status_code}")
-        # we are going to take 403 as meaning that it could be there...
-        return response.status_code < 400 or response.status_code == 403
+        response = session.head(url, allow_redirects=True, timeout=timeout)
+        transferred += sum(header_bytes(r) for r in response.history + [response])
+        if link_is_good(response.status_code):
+            return response, transferred
+        logging.debug(f"HEAD {url} returned status code: {response.status_code}, trying GET")
+    except requests.TooManyRedirects:
+        raise
     except requests.RequestException as ex:
-        logging.debug(f"Checking URL: {url} caused exception: {ex}")
-        return False
+        if could_not_connect(ex):
+            raise
+        # some servers just hang up on HEAD
+        logging.debug(f"HEAD {url} caused exception: {ex}, trying GET")
+    with session.get(url, allow_redirects=True, timeout=timeout, stream=True) as response:
+        transferred += sum(header_bytes(r) for r in response.history + [response])
+    return response, transferred
+
+
+# read timeouts and hang ups may well go away if we try again later, unlike a 404 or a redirect loop
+TRANSIENT_LINK_ERRORS = (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)
+
+
+def check_url_verdict(url, host_health=None, session=None):
+    return _check_url(url, host_health, session)[0]
+
 
+# returns the verdict and whether it is down to something that may not happen next time
+def _check_url(url, host_health, session):
+    if url.startswith(DOI_ORG_PREFIX):
+        url = DOI_ORG_API + url[len(DOI_ORG_PREFIX):]
+    host = urlsplit(url).hostname
+    if host_health and not host_health.allow(host):
+        logging.debug(f"Checking URL: {url} skipped, {host} is unreachable")
+        return LinkVerdict.HOST_UNREACHABLE, True
+    try:
+        response, transferred = probe_url(url, session or make_link_session())
+        if host_health:
+            host_health.record_success(host)
+        logging.debug(f"Checking URL: {url} returned status code: {response.status_code} "
+                      f"({transferred} bytes transferred)")
+        return LinkVerdict.VALID if link_is_good(response.status_code) else LinkVerdict.INVALID, False
+    except requests.RequestException as ex:
+        if could_not_connect(ex):
+            # the host that isn't talking to us may be one we were redirected to, in which case it
+            # is the one to blame rather than the redirector (doi.org, link shorteners, ...)
+            failed_host = urlsplit(ex.request.url).hostname if ex.request is not None else host
+            if host_health:
+                if failed_host != host:
+                    host_health.record_success(host)
+                host_health.record_failure(failed_host)
+            logging.debug(f"Checking URL: {url} could not connect to {failed_host}: {ex}")
+            return LinkVerdict.HOST_UNREACHABLE, True
+        # read timeouts, redirect loops, hang ups, and the like. we got through to the host, the link is just bad
+        if host_health:
+            host_health.record_success(host)
+        logging.debug(f"Checking URL: {url} caused exception: {ex}")
+        return LinkVerdict.INVALID, isinstance(ex, TRANSIENT_LINK_ERRORS)
+    finally:
+        if host_health:
+            host_health.release(host)
+
+
+# the yes/no answer: is the link good? check_url_verdict says why when it isn't
+def check_url_validity(url, host_health=None, session=None):
+    return check_url_verdict(url, host_health, session) == LinkVerdict.VALID
+
+
+ASCII_NON_LETTERS = re.compile(r'[^A-Za-z]+')
+NON_LETTERS = re.compile(r'[\W\d_]+')
+
+
+# Answers "does this cited author appear in any of these author names?" without going through
+# every name in python. papers with thousands of authors are common in physics and genomics.
+# the set of name parts catches the usual case of an exact last name match. otherwise a cited
+# author matches if it is a substring of an (accent and symbol stripped) name, which is a single
+# search of all the names joined together. the names are only letters, so a match can't
+# straddle the separator.
+class AuthorIndex:
+    def __init__(self, names):
+        parts = [self.split_name(name) for name in names]
+        self.name_parts = {part for name_parts in parts for part in name_parts}
+        self.joined = "\n".join("".join(name_parts) for name_parts in parts)
+
+    @staticmethod
+    def split_name(name):
+        # the same letters just_the_chars(name) keeps, split where it would drop something, but
+        # with a regex rather than a character at a time. most names are plain ASCII, which
+        # is simpler still.
+        if name.isascii():
+            return ASCII_NON_LETTERS.sub(' ', name).lower().split()
+        letters = NON_LETTERS.sub(' ', unicodedata.normalize("NFD", name))
+        if not letters.replace(' ', '').isalpha():
+            # a few numeric characters (like ½) get past the regex
+            letters = just_the_chars(name, space_ok=True)
+        return letters.lower().split()
+
+    def __contains__(self, author):
+        author = author.lower()
+        return author in self.name_parts or (bool(self.joined) and author in self.joined)
+
+
+class BibResult(namedtuple('BibResult', ['title', 'year', 'author', 'venue', 'is_retracted'])):
+    # the index is built the first time it is needed and stays with the result, so cached
+    # search results don't have to rebuild it
+    @cached_property
+    def author_index(self):
+        return AuthorIndex(self.author)
 
-BibResult = namedtuple('BibResult', ['title', 'year', 'author', 'venue', 'is_retracted'])
 
 OPENALEX_API = "https://api.openalex.org/works"
 
@@ -273,39 +474,36 @@ def alphanum_spaces_only(title):
 
 def search_openalex(title):
     no_symbol_title = alphanum_spaces_only(title)
-    try:
-        logging.debug(f"Searching OpenAlex for: {no_symbol_title}")
-        retracted = []
-        not_retracted = []
-        for work in Works().search_filter(title=f'"{no_symbol_title}"').get():
-            is_retracted = work['is_retracted']
-            result_title = work['title']
-            logging.debug(f"Found OpenAlex title: {result_title}")
-            if not result_title or not (  # we want to return the title if it matches or if it is a retracted paper
-                    is_retracted or "retracted" in result_title.lower() or result_title_compare(result_title, title)):
-                continue
-            result_year = str(work['publication_year'])
-            result_authors = [author['author']['display_name'] for author in work['authorships']]
-            result_primary_location = work['primary_location']
-            result_primary_location_source = result_primary_location['source'] if result_primary_location else None
-            result_primary_location_name = result_primary_location_source[
-                'display_name'] if result_primary_location_source else None
-
-            bib_result = BibResult(result_title, result_year, result_authors, result_primary_location_name,
-                                   is_retracted)
-            if is_retracted:
-                retracted.append(bib_result)
-            else:
-                not_retracted.append(bib_result)
+    logging.debug(f"Searching OpenAlex for: {no_symbol_title}")
+    retracted = []
+    not_retracted = []
+    for work in Works().search_filter(title=f'"{no_symbol_title}"').get():
+        is_retracted = work['is_retracted']
+        result_title = work['title']
+        logging.debug(f"Found OpenAlex title: {result_title}")
+        if not result_title or not (  # we want to return the title if it matches or if it is a retracted paper
+                is_retracted or "retracted" in result_title.lower() or result_title_compare(result_title, title)):
+            continue
+        result_year = str(work['publication_year'])
+        result_authors = [author['author']['display_name'] for author in work['authorships']]
+        result_primary_location = work['primary_location']
+        result_primary_location_source = result_primary_location['source'] if result_primary_location else None
+        result_primary_location_name = result_primary_location_source[
+            'display_name'] if result_primary_location_source else None
+
+        bib_result = BibResult(result_title, result_year, result_authors, result_primary_location_name,
+                               is_retracted)
+        if is_retracted:
+            retracted.append(bib_result)
+        else:
+            not_retracted.append(bib_result)
 
-        # yield the retracted papers first
-        for result in retracted:
-            yield result
+    # yield the retracted papers first
+    for result in retracted:
+        yield result
 
-        for result in not_retracted:
-            yield result
-    except Exception as ex:
-        logging.error(f"Error fetching OpenAlex data for {title}: {ex}")
+    for result in not_retracted:
+        yield result
 
 
 def result_title_compare(result_title, title):
@@ -314,34 +512,142 @@ def result_title_compare(result_title, title):
     return just_the_chars(result_title.lower()) == just_the_chars(title.lower())
 
 
+# arXiv asks for no more than one request every three seconds. the client spaces out its own
+# requests, so all the searches share one and take turns with it.
+ARXIV_CLIENT = arxiv.Client()
+ARXIV_LOCK = threading.Lock()
+
+
 def search_arxiv(title):
+    logging.debug(f"Searching arXiv for: {title}")
+    search = arxiv.Search(query=f"ti:{title}", max_results=10, sort_by=arxiv.SortCriterion.Relevance)
+
+    # if we can't get a turn before the deadline nobody is waiting for the answer anymore
+    if not ARXIV_LOCK.acquire(timeout=SEARCH_DEADLINE):
+        raise TimeoutError("timed out waiting for a turn to query arXiv")
     try:
-        client = arxiv.Client()
-        logging.debug(f"Searching arXiv for: {title}")
-        search = arxiv.Search(query=f"ti:{title}", max_results=10, sort_by=arxiv.SortCriterion.Relevance)
-
-        for result in client.results(search):
-            result_title = result.title
-            is_retracted = "withdrawn" in result.comment.lower() if result.comment else False
-            logging.debug(f"arXiv title: {result_title}")
-            if not result_title or not result_title_compare(result_title, title):
-                continue
-            result_year = str(result.published.year)
-            result_authors = [author.name for author in result.authors]
-            yield BibResult(result_title, result_year, result_authors, "arXiv", is_retracted)
-    except Exception as ex:
-        logging.error(f"Error fetching arXiv data for {title}: {ex}")
+        results = list(ARXIV_CLIENT.results(search))
+    finally:
+        ARXIV_LOCK.release()
+
+    for result in results:
+        result_title = result.title
+        is_retracted = "withdrawn" in result.comment.lower() if result.comment else False
+        logging.debug(f"arXiv title: {result_title}")
+        if not result_title or not result_title_compare(result_title, title):
+            continue
+        result_year = str(result.published.year)
+        result_authors = [author.name for author in result.authors]
+        yield BibResult(result_title, result_year, result_authors, "arXiv", is_retracted)
 
 
-def search_for_title(title, arxiv_search=False):
-    openalex_results = search_openalex(title)
-    for result in openalex_results:
-        yield result
+# a search backend is anything that can take a title and yield BibResults whose title matches.
+# deadline is how many seconds we are willing to wait on the backend before giving up on it.
+# reports_retractions is for backends we rely on to tell us a paper was retracted, we don't
+# want a quick match from somewhere else to stop the search before they have had their say.
+# a backend that can't do the search should raise rather than yield nothing, so that a failed
+# search isn't taken for a title that isn't there.
+SearchBackend = namedtuple('SearchBackend', ['name', 'search', 'deadline', 'reports_retractions'],
+                           defaults=[False])
+
+SEARCH_DEADLINE = 10
+
+# how long a match from elsewhere is held back waiting for the backends that report retractions
+RETRACTION_GRACE = 2
+
+SEARCH_BACKENDS = [
+    SearchBackend("openalex", search_openalex, SEARCH_DEADLINE, reports_retractions=True),
+    SearchBackend("arxiv", search_arxiv, SEARCH_DEADLINE),
+]
 
-    if arxiv_search:
-        arxiv_results = search_arxiv(title)
-        for result in arxiv_results:
-            yield result
+
+def register_search_backend(name, search, deadline=SEARCH_DEADLINE, reports_retractions=False):
+    # local mirrors and other sources can be plugged in here. they will be queried
+    # alongside the built-in ones for every title.
+    backend = SearchBackend(name, search, deadline, reports_retractions)
+    SEARCH_BACKENDS.append(backend)
+    return backend
+
+
+SEARCH_FAILED = object()
+
+
+def _run_search_backend(backend, title, results, cancelled):
+    try:
+        for result in backend.search(title):
+            if cancelled.is_set():
+                break
+            results.put((backend, result))
+    except Exception as ex:
+        logging.error(f"Error searching {backend.name} for {title}: {ex}")
+        results.put((backend, SEARCH_FAILED))
+    finally:
+        # None tells search_for_title that this backend is done
+        results.put((backend, None))
+
+
+def search_for_title(title, backends=None, failed=None, retraction_grace=RETRACTION_GRACE):
+    # all the backends are queried at the same time and results are yielded as soon as they
+    # arrive, so the caller can stop at the first conclusive match rather than waiting for
+    # the slowest source. once the caller stops, or a backend misses its deadline, we stop
+    # listening to it, but there is no way to call back a request that is already out. its
+    # thread runs until the request returns or times out, and whatever it finds is dropped.
+    # the exception is that results from other backends are held back while the backends that
+    # report retractions are still going, so a retraction gets seen before a match from elsewhere.
+    # we only hold them for retraction_grace seconds though. after that they are let through, and
+    # a retraction that shows up later is only seen if the caller is still looking. the
+    # --retractions index doesn't have this problem.
+    # the names of backends that raised or missed their deadline are added to failed, if given,
+    # so the caller can tell an incomplete search from one that came up empty.
+    if backends is None:
+        backends = SEARCH_BACKENDS
+    results = queue.Queue()
+    cancelled = threading.Event()
+    start = time.monotonic()
+    pending = {}
+    held = []
+    holding = any(backend.reports_retractions for backend in backends)
+    hold_until = None
+    for backend in backends:
+        pending[backend] = start + backend.deadline
+        threading.Thread(target=_run_search_backend, args=(backend, title, results, cancelled), daemon=True).start()
+    try:
+        while pending:
+            wake = min(pending.values()) if hold_until is None else min(min(pending.values()), hold_until)
+            try:
+                backend, result = results.get(timeout=max(0, wake - time.monotonic()))
+            except queue.Empty:
+                now = time.monotonic()
+                for late_backend in [b for b, deadline in pending.items() if deadline <= now]:
+                    logging.debug(f"{late_backend.name} missed its {late_backend.deadline}s deadline for {title}")
+                    del pending[late_backend]
+                    if failed is not None:
+                        failed.add(late_backend.name)
+            else:
+                if backend not in pending:
+                    # this backend already missed its deadline
+                    continue
+                if result is None:
+                    del pending[backend]
+                elif result is SEARCH_FAILED:
+                    if failed is not None:
+                        failed.add(backend.name)
+                elif backend.reports_retractions or not holding:
+                    yield result
+                else:
+                    held.append(result)
+                    if hold_until is None:
+                        hold_until = time.monotonic() + retraction_grace
+            if holding and not any(b.reports_retractions for b in pending):
+                holding = False
+            elif holding and hold_until is not None and time.monotonic() >= hold_until:
+                logging.debug(f"stopped holding results for {title} after {retraction_grace}s")
+                holding = False
+            if held and not holding:
+                yield from held
+                held = []
+    finally:
+        cancelled.set()
 
 
 def normalize_quotes(ref: str) -> str:
@@ -522,115 +828,508 @@ def extract_possible_author_last_names(ref):
 
 
 def find_missing_authors(authors, item_authors):
-    missing = []
-    for author in authors:
-        found = False
-        for iauthor in item_authors:
-            if author.lower() in iauthor.lower():
-                found = True
-                break
-        if not found:
-            missing.append(author)
-    return missing
+    if not isinstance(item_authors, AuthorIndex):
+        item_authors = AuthorIndex(item_authors)
+    return [author for author in authors if author not in item_authors]
 
 
-def check_references_validity(references, only_link_check, strict_title):
-    sketchy = []
-    for ref in references:
-        links = find_urls_or_dois(ref)
-        sketchy_problem = []
+def normalize_doi(doi):
+    return doi.strip().rstrip('.,;').lower()
 
-        if links:
-            bad_links = [url for url in links if not check_url_validity(url)]
-            if bad_links:
-                sketchy_problem.append("❌ Invalid DOI or URL: " + ", ".join(bad_links))
-            else:
-                sketchy_problem.append(f"✅ All links are valid: {', '.join(links)}")
 
+def normalize_title(title):
+    # the same normalization result_title_compare uses
+    return just_the_chars(title.lower())
+
+
+# An in memory index of retracted papers loaded from a Retraction Watch style CSV, so
+# we can flag retractions without going to the network.
+class RetractionIndex:
+    # titles like "Introduction" or "Editorial" are shared by thousands of papers, so a title on
+    # its own only counts if it is long enough to say which paper it is. DOIs always count.
+    MIN_TITLE_WORDS = 3
+    MIN_TITLE_LENGTH = 16
+
+    DOI_COLUMNS = ["OriginalPaperDOI", "DOI", "doi"]
+    TITLE_COLUMNS = ["Title", "title"]
+    NATURE_COLUMNS = ["RetractionNature", "Nature"]
+
+    def __init__(self, dois=(), titles=()):
+        self.dois = frozenset(normalize_doi(doi) for doi in dois)
+        self.titles = frozenset(normalize_title(title) for title in titles if self.distinctive(title))
+
+    @classmethod
+    def distinctive(cls, title):
+        return len(title.split()) >= cls.MIN_TITLE_WORDS and len(normalize_title(title)) >= cls.MIN_TITLE_LENGTH
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        dois = []
+        titles = []
+        with open(csv_path, newline='', encoding='utf-8-sig', errors='replace') as f:
+            for row in csv.DictReader(f):
+                nature = next((row[c] for c in cls.NATURE_COLUMNS if row.get(c)), None)
+                # Retraction Watch also lists corrections and expressions of concern
+                if nature and nature.strip().lower() != "retraction":
+                    continue
+                doi = next((row[c] for c in cls.DOI_COLUMNS if row.get(c)), None)
+                if doi and DOI_PATTERN.match(doi.strip()):
+                    dois.append(doi)
+                title = next((row[c] for c in cls.TITLE_COLUMNS if row.get(c)), None)
+                if title:
+                    titles.append(title)
+        logging.debug(f"Loaded {len(dois)} retracted DOIs and {len(titles)} retracted titles from {csv_path}")
+        return cls(dois, titles)
+
+    def is_retracted(self, ref, title):
+        return (normalize_title(title) in self.titles or
+                any(normalize_doi(doi) in self.dois for doi in DOI_PATTERN.findall(ref)))
+
+
+RETRACTED = "☣️ This paper is retracted!"
+
+
+def is_problem(message):
+    return message[0] != "✅" and message[0] != "👉"
+
+
+# what we found out about a single reference. match is the search result the verdict was based on
+# (if any). title_found is None if we didn't search for the title, and year_found is None unless
+# the title was found and the reference has a year. found_year is the year we found when it
+# doesn't agree with the reference. inexact_titles are only collected with strict_title.
+class RefResult(namedtuple('RefResult', ['ref', 'title', 'year', 'authors', 'links', 'match', 'retracted',
+                                         'bad_links', 'unreachable_links', 'has_venue', 'title_found',
+                                         'inexact_titles', 'year_found', 'found_year', 'missing_authors'])):
+    # the messages the command line prints
+    @property
+    def problems(self):
+        problems = []
+        if self.retracted:
+            problems.append(RETRACTED)
+        if self.links:
+            if self.bad_links:
+                problems.append("❌ Invalid DOI or URL: " + ", ".join(self.bad_links))
+            if self.unreachable_links:
+                problems.append("❌ Host unreachable: " + ", ".join(self.unreachable_links))
+            if not self.bad_links and not self.unreachable_links:
+                problems.append(f"✅ All links are valid: {', '.join(self.links)}")
+        if not self.has_venue:
+            if self.links:
+                problems.append("👉 No venue info, so only checking links")
+            else:
+                problems.append("❌ No venue info or links, this reference looks bogus")
+        for inexact_title in self.inexact_titles:
+            problems.append(f"⚠️ Title not exact: found '{inexact_title}' != '{self.title}'")
+        if self.title_found is False:
+            problems.append(f"❌ Title not found: {self.title}")
+        elif self.title_found:
+            problems.append(f"✅ Found title: {self.title}")
+            if not self.year:
+                problems.append("☣️ Publication year missing from reference")
+            elif self.year_found is False:
+                problems.append(f'❌ found year {self.found_year} but looking for {self.year}')
+            else:
+                problems.append(f"✅ Found year: {self.year}")
+            if self.missing_authors:
+                problems.append("❌ Missing authors: " + ", ".join(self.missing_authors))
+            else:
+                problems.append("✅ Authors are consistent")
+        return problems
+
+    @property
+    def has_problems(self):
+        return any(is_problem(p) for p in self.problems)
+
+
+PdfResult = namedtuple('PdfResult', ['path', 'references'])
+
+
+CACHE_SIZE = 10000
+
+
+# a dictionary that forgets the least recently used entries once it holds more than max_size
+class LRUCache:
+    def __init__(self, max_size=CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        if key not in self.entries:
+            return default
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+
+# RefChecker is the entry point for using refcheck from python. it holds on to everything that is
+# worth reusing between calls: the HTTP session, host health, link verdicts, search results, and
+# the dictionary, so checking thousands of PDFs with one instance doesn't redo work. cache_size
+# caps how many link verdicts and how many title searches are remembered.
+class RefChecker:
+    def __init__(self, only_link_check=False, strict_title=False, host_failures=HOST_FAILURE_THRESHOLD,
+                 search_backends=None, words=None, host_health=None, session=None, retractions=None,
+                 cache_size=CACHE_SIZE):
+        self.only_link_check = only_link_check
+        self.retractions = retractions
+        self.strict_title = strict_title
+        self.search_backends = search_backends
+        self.words = words if words is not None else WORDS
+        self.host_health = host_health if host_health is not None else HostHealth(threshold=host_failures)
+        self.session = session if session is not None else make_link_session()
+        self.link_cache = LRUCache(cache_size)
+        self.search_cache = LRUCache(cache_size)
+
+    def extract_references(self, pdf):
+        text_lines = extract_text_from_pdf(pdf)
+        return [sanitize_ref(x) for x in extract_references(text_lines, self.words)]
+
+    def check_pdf(self, pdf, name=None):
+        # pdf is a path or the bytes of a PDF. bytes need a name to report the results under
+        return PdfResult(name if name is not None else pdf, self.check_references(self.extract_references(pdf)))
+
+    def check_pdfs(self, pdfs):
+        # pdfs are paths or (name, bytes) pairs, like the ones find_pdfs produces. a PDF we can't
+        # read is logged and skipped rather than ending the run.
+        for pdf in pdfs:
+            name, pdf = pdf if isinstance(pdf, tuple) else (pdf, pdf)
+            try:
+                references = self.extract_references(pdf)
+            except Exception as ex:
+                logging.error(f"Could not read {name}: {ex}")
+                continue
+            yield PdfResult(name, self.check_references(references))
+
+    def check_references(self, references):
+        return [self.check_reference(ref) for ref in references]
+
+    def check_url(self, url):
+        verdict = self.link_cache.get(url)
+        if verdict is None:
+            verdict, transient = _check_url(url, self.host_health, self.session)
+            # unreachable hosts may come back, the host health will take care of those. links
+            # that timed out or hung up on us get another try the next time they come up.
+            if not transient:
+                self.link_cache.put(url, verdict)
+        return verdict
+
+    def search_for_title(self, title):
+        # a previous search for this title may have stopped early, so we replay what it saw and
+        # only go back to the backends if that wasn't enough
+        seen, complete = self.search_cache.get(title, ([], False))
+        seen = list(seen)
+        yield from list(seen)
+        if complete:
+            return
+        failed = set()
+        try:
+            for result in search_for_title(title, self.search_backends, failed):
+                if result in seen:
+                    continue
+                seen.append(result)
+                yield result
+            # if a backend failed, the next search for this title should give it another go
+            complete = not failed
+        finally:
+            # this runs when the caller stops early too, so we remember what it got to see
+            self.search_cache.put(title, (seen, complete))
+
+    def check_reference(self, ref):
+        links = find_urls_or_dois(ref)
         (title, after_title) = extract_possible_title(ref)
+
+        # this is cheap, so do it before going to the network
+        retracted = bool(self.retractions and self.retractions.is_retracted(ref, title))
+
+        verdicts = [(url, self.check_url(url)) for url in links]
+        bad_links = [url for url, verdict in verdicts if verdict == LinkVerdict.INVALID]
+        unreachable_links = [url for url, verdict in verdicts if verdict == LinkVerdict.HOST_UNREACHABLE]
+
         year = extract_possible_year(after_title)
         authors = extract_possible_author_last_names(ref)
+        match = None
+        title_found = None
+        inexact_titles = []
+        year_found = None
+        found_year = None
+        missing_authors = []
 
         # filter out parts that are URL related
         published_somewhere = [x for x in after_title.split(". ") if (
                 x and "accessed" not in x.lower() and "retrieved" not in x.lower() and x[
             0].isalpha() and not x.lower().startswith("url") and not x.lower().startswith("http"))]
 
-        if not published_somewhere:
-            if links:
-                sketchy_problem.append("👉 No venue info, so only checking links")
-            else:
-                sketchy_problem.append("❌ No venue info or links, this reference looks bogus")
-
-        if published_somewhere and not only_link_check:
-            found_title = False
+        if published_somewhere and not self.only_link_check:
+            title_found = False
             year_problem = None  # this means it's not set. '' means year was good
-            missing_authors = []
-            for search_result in search_for_title(title, arxiv_search="arxiv" in ref.lower()):
-                # accents and other characters that might vary
-                item_authors = [just_the_chars(x) for x in search_result.author]
-                found_title = True
+            for search_result in self.search_for_title(title):
+                match = search_result
+                title_found = True
                 if search_result.is_retracted:
-                    sketchy_problem.append("☣️ This paper is retracted!")
-                if strict_title:
+                    retracted = True
+                if self.strict_title:
                     if search_result.title != title:
-                        sketchy_problem.append(f"⚠️ Title not exact: found '{search_result.title}' != '{title}'")
+                        inexact_titles.append(search_result.title)
                 if year and year_problem != '' and search_result.year:
                     if search_result.year == str(year):
                         year_problem = ''
                     else:
-                        year_problem = f'❌ found year {search_result.year} but looking for {year}'
-                missing_authors = find_missing_authors(authors, item_authors)
+                        year_problem = search_result.year
+                missing_authors = find_missing_authors(authors, search_result.author_index)
                 if (not year or year_problem == '') and not missing_authors:
                     break
+            if title_found and year:
+                year_found = not year_problem
+                found_year = year_problem or None
 
-            if not found_title:
-                sketchy_problem.append(f"❌ Title not found: {title}")
-            else:
-                sketchy_problem.append(f"✅ Found title: {title}")
-                if not year:
-                    sketchy_problem.append("☣️ Publication year missing from reference")
-                elif year_problem:
-                    sketchy_problem.append(year_problem)
-                else:
-                    sketchy_problem.append(f"✅ Found year: {year}")
-                if missing_authors:
-                    sketchy_problem.append("❌ Missing authors: " + ", ".join(missing_authors))
-                else:
-                    sketchy_problem.append(f"✅ Authors are consistent")
+        return RefResult(ref, title, year, authors, links, match, retracted, bad_links, unreachable_links,
+                         bool(published_somewhere), title_found, inexact_titles, year_found, found_year,
+                         missing_authors)
+
+
+def check_references_validity(references, only_link_check, strict_title, host_health=None, session=None):
+    checker = RefChecker(only_link_check=only_link_check, strict_title=strict_title, host_health=host_health,
+                         session=session)
+    return [(result.ref, result.problems) for result in checker.check_references(references) if result.problems]
+
+
+# if the first argument isn't a subcommand, we run check so that "refcheck.py paper.pdf" keeps working
+class DefaultCheckGroup(click.Group):
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] not in ctx.help_option_names:
+            args.insert(0, 'check')
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCheckGroup)
+def main():
+    """
+    Check the references in PDF files for validity using OpenAlex, arXiv, and URL checking.
+
+    If no command is given, check is run, so "refcheck.py paper.pdf" works. See
+    "refcheck.py check --help" for its options.
+    """
+
+
+def parse_shard(ctx, param, value):
+    if value is None:
+        return None
+    match = re.fullmatch(r'(\d+)/(\d+)', value)
+    if not match or not 0 <= int(match.group(1)) < int(match.group(2)):
+        raise click.BadParameter("must be i/N with 0 <= i < N")
+    return int(match.group(1)), int(match.group(2))
+
+
+def in_shard(pdf, shard):
+    # we shard on the contents of the file, so a file stays in the same shard no matter
+    # where it lives (even inside an archive) or what else gets added to the corpus
+    if not shard:
+        return True
+    index, count = shard
+    if isinstance(pdf, (bytes, bytearray)):
+        content_hash = hashlib.sha256(pdf)
+    else:
+        content_hash = hashlib.sha256()
+        with open(pdf, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                content_hash.update(chunk)
+    return int(content_hash.hexdigest(), 16) % count == index
+
+
+def pdf_sort_key(pdf_path):
+    # sort them so that numerical order is preserved (assuming the numbers are less than 1,000,000
+    return os.path.sep.join([p.zfill(6) if p.isdigit() else p for p in pdf_path.split(os.path.sep)])
 
-        if sketchy_problem:
-            sketchy.append((ref, sketchy_problem))
-    return sketchy
 
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
 
-@click.command()
-@click.argument('pdf_path', type=click.Path(exists=True))
+
+# both of these raise if the archive can't be opened at all, but a member that can't be read is
+# just skipped so one bad PDF doesn't stop the rest
+def pdfs_in_zip(name, zip_file):
+    with zipfile.ZipFile(zip_file) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and info.filename.lower().endswith('.pdf'):
+                try:
+                    data = archive.read(info)
+                except Exception as ex:
+                    logging.error(f"Could not read {name}:{info.filename}: {ex}")
+                    continue
+                yield f"{name}:{info.filename}", data
+
+
+def pdfs_in_tar(name, fileobj=None):
+    # r|* reads the tar as a stream, so we can start on the first PDF before the rest has arrived
+    with tarfile.open(name=None if fileobj else name, fileobj=fileobj, mode='r|*') as archive:
+        try:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith('.pdf'):
+                    try:
+                        data = archive.extractfile(member).read()
+                    except Exception as ex:
+                        logging.error(f"Could not read {name}:{member.name}: {ex}")
+                        continue
+                    yield f"{name}:{member.name}", data
+        except Exception as ex:
+            # a stream can't skip over a broken spot, so this is as far as we get
+            logging.error(f"Could not read the rest of {name}: {ex}")
+
+
+# a stream with the bytes we already read from it put back on the front
+class PrefixedStream:
+    def __init__(self, prefix, stream):
+        self.prefix = prefix
+        self.stream = stream
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data, self.prefix = self.prefix + self.stream.read(), b''
+            return data
+        data, self.prefix = self.prefix[:size], self.prefix[size:]
+        if len(data) < size:
+            data += self.stream.read(size - len(data))
+        return data
+
+
+def pdfs_from_stdin(stdin=None):
+    if stdin is None:
+        stdin = sys.stdin.buffer
+    # unlike peek, read waits for all 4 bytes (or the end of the input) on a pipe
+    magic = stdin.read(4)
+    if not magic:
+        raise click.UsageError("There is nothing on stdin to check")
+    if magic.startswith(b'%PDF'):
+        yield '-', magic + stdin.read()
+    elif magic.startswith(b'PK'):
+        # zip keeps its directory at the end, so there's no way around reading all of it
+        try:
+            yield from pdfs_in_zip('-', io.BytesIO(magic + stdin.read()))
+        except zipfile.BadZipFile as ex:
+            raise click.UsageError(f"stdin is not a readable zip archive: {ex}")
+    else:
+        try:
+            yield from pdfs_in_tar('-', fileobj=PrefixedStream(magic, stdin))
+        except tarfile.TarError as ex:
+            raise click.UsageError(f"stdin is not a PDF, zip archive, or tar archive: {ex}")
+
+
+# yields (name, pdf) for every PDF in pdf_path, where pdf is a path or the bytes of the PDF.
+# with path_list, pdf_path (or stdin if it is -) has one path per line. each line is
+# handled as soon as it is read, so we don't need the whole list up front.
+def find_pdfs(pdf_path, path_list=False):
+    if path_list:
+        with click.open_file(pdf_path) as f:
+            for line in f:
+                if line.strip():
+                    yield from find_pdfs(line.strip())
+    elif pdf_path == '-':
+        yield from pdfs_from_stdin()
+    elif not os.path.exists(pdf_path):
+        logging.error(f"{pdf_path} does not exist")
+    elif isdir(pdf_path):
+        pdfs = []
+        for root, dirs, files in os.walk(pdf_path):
+            for file in [os.path.join(root, f) for f in files if f.endswith('.pdf')]:
+                pdfs.append(file)
+        for file in sorted(pdfs, key=pdf_sort_key):
+            yield file, file
+    elif pdf_path.lower().endswith('.zip'):
+        try:
+            yield from pdfs_in_zip(pdf_path, pdf_path)
+        except zipfile.BadZipFile as ex:
+            logging.error(f"Could not read {pdf_path}: {ex}")
+    elif pdf_path.lower().endswith(TAR_SUFFIXES):
+        try:
+            yield from pdfs_in_tar(pdf_path)
+        except tarfile.TarError as ex:
+            logging.error(f"Could not read {pdf_path}: {ex}")
+    else:
+        yield pdf_path, pdf_path
+
+
+@main.command()
+@click.argument('pdf_path', type=click.Path(exists=True, allow_dash=True))
 @click.option('--dump-info', is_flag=True, default=False, help='Just dumpe the info gleaned from the PDF')
 @click.option('--only-link-check', is_flag=True, default=False, help='Only check the validity of the links')
 @click.option('--debug', is_flag=True, default=False, help='Show requests and responses from network')
 @click.option('--strict-title', is_flag=True, default=False, help='Do a strict comparison of the title')
 @click.option('--problems-only', is_flag=True, default=False, help='Only show problems')
-def main(pdf_path, dump_info, only_link_check, debug, strict_title, problems_only):
+@click.option('--host-failures', type=click.IntRange(min=1), default=HOST_FAILURE_THRESHOLD, show_default=True,
+              help='Connection failures before the rest of the links to a host are reported unreachable')
+@click.option('--shard', callback=parse_shard, metavar='i/N',
+              help='Only check the PDFs in shard i (counting from 0) of N, picked by a hash of the PDF contents')
+@click.option('--json-output', type=click.File('w', lazy=False),
+              help='Also write the results as JSON lines for merge')
+@click.option('--retractions', type=click.Path(exists=True, dir_okay=False),
+              help='A Retraction Watch style CSV of retracted papers to check references against')
+@click.option('--path-list', is_flag=True, default=False,
+              help='PDF_PATH is a file (or - for stdin) listing one PDF, archive, or directory per line')
+def check(pdf_path, dump_info, only_link_check, debug, strict_title, problems_only, host_failures, shard,
+          json_output, retractions, path_list):
     """
-    Check the references in PDF files for validity using OpenAlex, arXiv, and URL checking.
+    Check the references in PDF files.
 
     PDF_PATH can be a directory or a file. if it is a directory, all the PDFs in the directory will be checked.
+    it can also be a .zip or .tar(.gz) archive of PDFs, or - to read a PDF or an archive from stdin.
     """
     if debug:
         logging.basicConfig(level=logging.DEBUG)
-    if isdir(pdf_path):
-        pdfs = []
-        for root, dirs, files in os.walk(pdf_path):
-            for file in [os.path.join(root, f) for f in files if f.endswith('.pdf')]:
-                pdfs.append(file)
-        # sort them so that numerical order is preserved (assuming the numbers are less than 1,000,000
-        for file in sorted(pdfs, key=lambda x: os.path.sep.join(
-                [p.zfill(6) if p.isdigit() else p for p in x.split(os.path.sep)])):
-            check_references(file, dump_info, only_link_check, strict_title=strict_title, problems_only=problems_only)
+    checker = RefChecker(only_link_check=only_link_check, strict_title=strict_title, host_failures=host_failures,
+                         retractions=RetractionIndex.from_csv(retractions) if retractions else None)
+    # a lone PDF doesn't get a separator after it
+    single_pdf = (not path_list and pdf_path != '-' and not isdir(pdf_path) and
+                  not pdf_path.lower().endswith(('.zip',) + TAR_SUFFIXES))
+    for name, pdf in find_pdfs(pdf_path, path_list):
+        if not in_shard(pdf, shard):
+            continue
+        check_references(checker, name, dump_info, problems_only=problems_only, json_output=json_output, pdf=pdf)
+        if not single_pdf:
             print("-----------------------------\n")
-    else:
-        check_references(pdf_path, dump_info, only_link_check, strict_title=strict_title, problems_only=problems_only)
+
+
+@main.command()
+@click.argument('json_files', nargs=-1, required=True, type=click.File('r'))
+@click.option('--problems-only', is_flag=True, default=False, help='Only show problems')
+@click.option('--json-output', type=click.File('w'), help='Also write the merged results as JSON lines')
+def merge(json_files, problems_only, json_output):
+    """
+    Merge the --json-output files of sharded check runs into one report.
+    """
+    pdf_results = [pdf_result_from_json(line) for f in json_files for line in f if line.strip()]
+    pdf_results.sort(key=lambda x: pdf_sort_key(x.path))
+    for pdf_result in pdf_results:
+        print(f"Results for: {pdf_result.path}")
+        print(f"Found {len(pdf_result.references)} references.\n")
+        print_ref_results(pdf_result.references, problems_only)
+        print("-----------------------------\n")
+        if json_output:
+            json_output.write(pdf_result_to_json(pdf_result) + "\n")
+    references = [r for pdf_result in pdf_results for r in pdf_result.references]
+    with_problems = [r for r in references if r.has_problems]
+    print(f"Checked {len(pdf_results)} PDFs with {len(references)} references, "
+          f"{len(with_problems)} references have problems.")
+
+
+def pdf_result_to_json(pdf_result):
+    # problems is written out for anyone reading the JSON, it gets rebuilt from the other fields
+    return json.dumps({
+        "path": pdf_result.path,
+        "references": [dict(r._asdict(), match=r.match._asdict() if r.match else None, problems=r.problems)
+                       for r in pdf_result.references]}, ensure_ascii=False)
+
+
+def pdf_result_from_json(line):
+    record = json.loads(line)
+    return PdfResult(record["path"], [
+        RefResult(**{k: v for k, v in dict(r, match=BibResult(**r["match"]) if r["match"] else None).items()
+                     if k in RefResult._fields}) for r in record["references"]])
 
 
 def extract_info(references):
@@ -650,27 +1349,36 @@ def sanitize_ref(ref):
     return ref
 
 
-def check_references(pdf_path, dump_info, only_link_check, strict_title, problems_only):
+def print_ref_results(ref_results, problems_only):
+    for result in ref_results:
+        sketchy_problems = result.problems
+        if problems_only:
+            sketchy_problems = [p for p in sketchy_problems if is_problem(p)]
+        if not sketchy_problems:
+            continue
+        print(f"=> {result.ref}")
+        for sketchy_problem in sketchy_problems:
+            print(f"  {sketchy_problem}")
+    print()
+
+
+def check_references(checker, pdf_path, dump_info, problems_only, json_output=None, pdf=None):
     print(f"Extracting references from: {pdf_path}")
-    text_lines = extract_text_from_pdf(pdf_path)
-    references = [sanitize_ref(x) for x in extract_references(text_lines)]
+    try:
+        references = checker.extract_references(pdf if pdf is not None else pdf_path)
+    except Exception as ex:
+        # one broken PDF in a directory or an archive shouldn't stop us from checking the rest
+        logging.error(f"Could not read {pdf_path}: {ex}")
+        return
     print(f"Found {len(references)} references.\n")
     if dump_info:
         extract_info(references)
     else:
-        sketchy = check_references_validity(references, only_link_check, strict_title=strict_title)
-
-        if sketchy:
-            for (ref, sketchy_problems) in sketchy:
-
-                if problems_only:
-                    sketchy_problems = [p for p in sketchy_problems if p[0] != "✅" and p[0] != "👉"]
-                if not sketchy_problems:
-                    continue
-                print(f"=> {ref}")
-                for sketchy_problem in sketchy_problems:
-                    print(f"  {sketchy_problem}")
-        print()
+        ref_results = checker.check_references(references)
+        print_ref_results(ref_results, problems_only)
+        if json_output:
+            json_output.write(pdf_result_to_json(PdfResult(pdf_path, ref_results)) + "\n")
+            json_output.flush()
 
 
 if __name__ == "__main__":
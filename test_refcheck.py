@@ -1,7 +1,24 @@
+import io
+import os
+import socket
+import tarfile
+import tempfile
+import threading
+import time
 import unittest
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+import fitz
+from click.testing import CliRunner
 
 from refcheck import extract_possible_title, extract_possible_author_last_names, extract_possible_year, sanitize_ref, \
-    decide_on_hyphen, alphanum_spaces_only, search_openalex, search_arxiv
+    decide_on_hyphen, alphanum_spaces_only, search_openalex, search_arxiv, search_for_title, SearchBackend, BibResult, \
+    HostHealth, check_url_validity, check_url_verdict, LinkVerdict, RefChecker, RefResult, \
+    PdfResult, in_shard, pdf_result_to_json, pdf_result_from_json, \
+    RetractionIndex, RETRACTED, find_missing_authors, AuthorIndex, just_the_chars, \
+    find_pdfs, pdfs_from_stdin, main
 
 
 class TestRefCheck(unittest.TestCase):
@@ -161,6 +178,470 @@ class TestRefCheck(unittest.TestCase):
             self.assertTrue(result.is_retracted)
             self.assertEqual('2025', result.year)
 
+    def test_search_for_title_hedging(self):
+        fast_result = BibResult("Fast", "2020", ["Smith"], "Fast Venue", False)
+        slow_result = BibResult("Slow", "2020", ["Smith"], "Slow Venue", False)
+
+        def fast_search(title):
+            yield fast_result
+
+        def slow_search(title):
+            time.sleep(2)
+            yield slow_result
+
+        def broken_search(title):
+            raise Exception("mirror is down")
+            yield
+
+        backends = [SearchBackend("slow", slow_search, 0.5), SearchBackend("broken", broken_search, 0.5),
+                    SearchBackend("fast", fast_search, 0.5)]
+        start = time.monotonic()
+        # the slow backend misses its deadline, so we only get the fast result
+        self.assertEqual([fast_result], list(search_for_title("Whatever", backends)))
+        self.assertLess(time.monotonic() - start, 1.5)
+
+        # stopping at the first result shouldn't wait on the slow backend at all
+        start = time.monotonic()
+        for result in search_for_title("Whatever", [SearchBackend("slow", slow_search, 5),
+                                                    SearchBackend("fast", fast_search, 5)]):
+            self.assertEqual(fast_result, result)
+            break
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_search_for_title_waits_for_retractions(self):
+        frosty_pod = BibResult(self.test_titles[2], "2007", ["Wilbert Phillips-Mora", "Mike J. Wilkinson"],
+                               "Phytopathology", False)
+
+        def fast_search(title):
+            yield frosty_pod
+
+        def slow_retracting_search(title):
+            time.sleep(0.5)
+            yield frosty_pod._replace(is_retracted=True)
+
+        # the fast match is conclusive, but it must not hide the retraction that arrives later
+        checker = RefChecker(search_backends=[SearchBackend("arxiv", fast_search, 5),
+                                              SearchBackend("openalex", slow_retracting_search, 5, True)])
+        result = checker.check_reference(sanitize_ref(self.test_references[2]))
+        self.assertIn(RETRACTED, result.problems)
+
+        # a retraction reporting backend that misses its deadline doesn't hold things up forever
+        start = time.monotonic()
+        checker = RefChecker(search_backends=[SearchBackend("arxiv", fast_search, 5),
+                                              SearchBackend("openalex", slow_retracting_search, 0.1, True)])
+        result = checker.check_reference(sanitize_ref(self.test_references[2]))
+        self.assertNotIn(RETRACTED, result.problems)
+        self.assertEqual(frosty_pod, result.match)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+        # nor does one that is just slow, the held match gets let through after the grace period
+        def slower_retracting_search(title):
+            time.sleep(1)
+            yield frosty_pod._replace(is_retracted=True)
+
+        start = time.monotonic()
+        found = search_for_title(frosty_pod.title, [SearchBackend("arxiv", fast_search, 5),
+                                                    SearchBackend("openalex", slower_retracting_search, 5, True)],
+                                 retraction_grace=0.2)
+        self.assertEqual(frosty_pod, next(found))
+        self.assertLess(time.monotonic() - start, 0.5)
+        # the retraction still comes through for anyone who keeps looking
+        self.assertEqual([frosty_pod._replace(is_retracted=True)], list(found))
+
+    def test_host_health(self):
+        host_health = HostHealth(threshold=2, retry_seconds=3600)
+        self.assertTrue(host_health.allow("dead.example.edu"))
+        host_health.record_failure("dead.example.edu")
+        self.assertTrue(host_health.allow("dead.example.edu"))
+        host_health.record_failure("dead.example.edu")
+        # the circuit is open, so we fail fast
+        self.assertFalse(host_health.allow("dead.example.edu"))
+        # other hosts aren't affected
+        self.assertTrue(host_health.allow("alive.example.edu"))
+
+        # once the retry time has passed, a single probe gets through
+        host_health.retry_seconds = 0
+        self.assertTrue(host_health.allow("dead.example.edu"))
+        self.assertFalse(host_health.allow("dead.example.edu"))
+        # a failed probe opens the circuit again
+        host_health.record_failure("dead.example.edu")
+        self.assertTrue(host_health.allow("dead.example.edu"))
+        # a successful probe closes it
+        host_health.record_success("dead.example.edu")
+        self.assertTrue(host_health.allow("dead.example.edu"))
+        self.assertTrue(host_health.allow("dead.example.edu"))
+
+    def test_check_url_verdict_probing(self):
+        requests_seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                requests_seen.append(("HEAD", self.path))
+                if self.path == "/no-head.pdf":
+                    self.send_response(405)
+                    self.end_headers()
+                elif self.path == "/drops-head.pdf":
+                    # hang up without saying anything
+                    self.close_connection = True
+                else:
+                    self.do_GET()
+
+            def do_GET(self):
+                if self.command == "GET":
+                    requests_seen.append(("GET", self.path))
+                if self.path.startswith("/dead"):
+                    # off to a publisher that isn't there anymore
+                    self.send_response(302)
+                    self.send_header("Location", f"http://localhost:{closed_port}{self.path}")
+                    self.end_headers()
+                    return
+                if self.path == "/hangs-up":
+                    self.close_connection = True
+                    return
+                if self.path == "/loop":
+                    self.send_response(302)
+                    self.send_header("Location", "/loop")
+                    self.end_headers()
+                    return
+                self.send_response(200 if self.path != "/missing" else 404)
+                self.send_header("Content-Length", str(50_000_000))
+                self.end_headers()
+                if self.command == "GET":
+                    try:
+                        # a big PDF that we should never read all of
+                        for _ in range(50):
+                            self.wfile.write(b"x" * 1_000_000)
+                    except OSError:
+                        pass
+
+        with socket.socket() as closed:
+            closed.bind(("127.0.0.1", 0))
+            closed_port = closed.getsockname()[1]
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_port}"
+        try:
+            self.assertEqual(LinkVerdict.VALID, check_url_verdict(f"{base}/paper.pdf"))
+            self.assertEqual([("HEAD", "/paper.pdf")], requests_seen)
+            requests_seen.clear()
+
+            start = time.monotonic()
+            self.assertEqual(LinkVerdict.VALID, check_url_verdict(f"{base}/no-head.pdf"))
+            self.assertEqual([("HEAD", "/no-head.pdf"), ("GET", "/no-head.pdf")], requests_seen)
+            self.assertLess(time.monotonic() - start, 2)
+
+            requests_seen.clear()
+            host_health = HostHealth(threshold=1)
+            self.assertEqual(LinkVerdict.VALID, check_url_verdict(f"{base}/drops-head.pdf", host_health))
+            self.assertEqual([("HEAD", "/drops-head.pdf"), ("GET", "/drops-head.pdf")], requests_seen)
+            self.assertEqual({}, host_health.failures)
+
+            self.assertEqual(LinkVerdict.INVALID, check_url_verdict(f"{base}/missing"))
+            # the old yes/no answer is still there for anyone who just wants that
+            self.assertIs(True, check_url_validity(f"{base}/paper.pdf"))
+            self.assertIs(False, check_url_validity(f"{base}/missing"))
+            self.assertEqual(LinkVerdict.INVALID, check_url_verdict(f"{base}/loop"))
+
+            # a half open probe that ends in something other than a connection error has to let
+            # the host recover rather than leaving it unreachable for good
+            host_health = HostHealth(threshold=1, retry_seconds=0)
+            self.assertEqual(LinkVerdict.HOST_UNREACHABLE,
+                             check_url_verdict(f"http://127.0.0.1:{closed_port}/gone.pdf", host_health))
+            self.assertEqual(LinkVerdict.INVALID, check_url_verdict(f"{base}/loop", host_health))
+            for _ in range(3):
+                self.assertEqual(LinkVerdict.VALID, check_url_verdict(f"{base}/paper.pdf", host_health))
+
+            # a dead host we get redirected to is the one that gets blamed, not the redirector
+            host_health = HostHealth(threshold=1)
+            for i in range(3):
+                self.assertEqual(LinkVerdict.HOST_UNREACHABLE, check_url_verdict(f"{base}/dead{i}", host_health))
+            self.assertEqual({"localhost": 3}, host_health.failures)
+            self.assertEqual(LinkVerdict.VALID, check_url_verdict(f"{base}/paper.pdf", host_health))
+
+            # a link that hung up on us is bad for now, but it gets asked again next time. a 404 doesn't.
+            checker = RefChecker()
+            requests_seen.clear()
+            for _ in range(2):
+                self.assertEqual(LinkVerdict.INVALID, checker.check_url(f"{base}/hangs-up"))
+                self.assertEqual(LinkVerdict.INVALID, checker.check_url(f"{base}/missing"))
+            self.assertEqual(2, requests_seen.count(("GET", "/hangs-up")))
+            self.assertEqual(1, requests_seen.count(("HEAD", "/missing")))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_ref_checker(self):
+        searched = []
+        frosty_pod = BibResult(self.test_titles[2], "2007", ["Wilbert Phillips-Mora", "Mike J. Wilkinson"],
+                               "Phytopathology", False)
+
+        def local_search(title):
+            searched.append(title)
+            if title == frosty_pod.title:
+                yield frosty_pod
+
+        checker = RefChecker(search_backends=[SearchBackend("local", local_search, 5)])
+        references = [sanitize_ref(self.test_references[2]), sanitize_ref(self.test_references[8])]
+        results = checker.check_references(references + references)
+        self.assertEqual(4, len(results))
+        for result in results:
+            self.assertIsInstance(result, RefResult)
+        self.assertEqual(results[0], results[2])
+        self.assertEqual(frosty_pod, results[0].match)
+        self.assertEqual(2007, results[0].year)
+        self.assertEqual(["✅ Found title: " + frosty_pod.title, "✅ Found year: 2007", "✅ Authors are consistent"],
+                         results[0].problems)
+        self.assertTrue(results[0].title_found)
+        self.assertTrue(results[0].year_found)
+        self.assertEqual([], results[0].missing_authors)
+        self.assertFalse(results[0].retracted)
+        self.assertIsNone(results[1].match)
+        self.assertIs(False, results[1].title_found)
+        self.assertEqual(["❌ Title not found: " + self.test_titles[8]], results[1].problems)
+
+        # a year that doesn't agree and an author that isn't there
+        checker = RefChecker(search_backends=[SearchBackend("local", lambda title: iter(
+            [frosty_pod._replace(year="2008", author=["Wilbert Phillips-Mora"])]), 5)])
+        result = checker.check_reference(sanitize_ref(self.test_references[2]))
+        self.assertIs(False, result.year_found)
+        self.assertEqual("2008", result.found_year)
+        self.assertEqual(["Wilkinson"], result.missing_authors)
+        self.assertEqual(["✅ Found title: " + frosty_pod.title, "❌ found year 2008 but looking for 2007",
+                          "❌ Missing authors: Wilkinson"], result.problems)
+        # the second time around the titles came out of the cache
+        self.assertEqual([self.test_titles[2], self.test_titles[8]], searched)
+
+        # the caches don't grow past their size
+        searched.clear()
+        checker = RefChecker(search_backends=[SearchBackend("local", local_search, 5)], cache_size=1)
+        checker.check_references(references + references[:1])
+        self.assertEqual(1, len(checker.search_cache))
+        self.assertEqual([self.test_titles[2], self.test_titles[8], self.test_titles[2]], searched)
+
+        # a search that failed isn't remembered as one that found nothing
+        searched.clear()
+
+        def flaky_search(title):
+            searched.append(title)
+            if len(searched) == 1:
+                raise ConnectionError("service unavailable")
+            return local_search(title)
+
+        checker = RefChecker(search_backends=[SearchBackend("flaky", flaky_search, 5)])
+        self.assertIs(False, checker.check_reference(references[0]).title_found)
+        result = checker.check_reference(references[0])
+        self.assertEqual(frosty_pod, result.match)
+        checker.check_reference(references[0])
+        self.assertEqual(3, len(searched))
+
+    def test_in_shard(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdfs = []
+            for i in range(20):
+                pdfs.append(os.path.join(tmpdir, f"{i}.pdf"))
+                with open(pdfs[-1], 'wb') as f:
+                    f.write(f"paper {i}".encode())
+            shards = [[pdf for pdf in pdfs if in_shard(pdf, (i, 3))] for i in range(3)]
+            # every PDF ends up in exactly one shard
+            self.assertEqual(sorted(pdfs), sorted(shards[0] + shards[1] + shards[2]))
+            self.assertTrue(all(in_shard(pdf, None) for pdf in pdfs))
+
+    def test_pdf_result_json(self):
+        match = BibResult("A Title", "2020", ["Ada Lovelace"], "Venue", False)
+        pdf_result = PdfResult("papers/1.pdf", [
+            RefResult("[1] A. Lovelace. A Title. Venue, 2020.", "A Title", 2020, ["Lovelace"], [], match,
+                      retracted=False, bad_links=[], unreachable_links=[], has_venue=True, title_found=True,
+                      inexact_titles=[], year_found=True, found_year=None, missing_authors=[]),
+            RefResult("[2] Nobody. Nothing. https://example.com/gone", "Nothing", None, [], ["https://example.com/gone"],
+                      None, retracted=True, bad_links=["https://example.com/gone"], unreachable_links=[],
+                      has_venue=True, title_found=False, inexact_titles=[], year_found=None, found_year=None,
+                      missing_authors=[])])
+        self.assertEqual(pdf_result, pdf_result_from_json(pdf_result_to_json(pdf_result)))
+        self.assertFalse(pdf_result.references[0].has_problems)
+        self.assertEqual([RETRACTED, "❌ Invalid DOI or URL: https://example.com/gone", "❌ Title not found: Nothing"],
+                         pdf_result.references[1].problems)
+
+    def test_retraction_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            csv_path = os.path.join(tmpdir, "retractions.csv")
+            with open(csv_path, 'w', encoding='utf-8') as f:
+                f.write('Record ID,Title,OriginalPaperDOI,RetractionNature\n'
+                        '1,"Lysyl oxidase is essential for hypoxia-induced metastasis",10.1038/nature04695,Retraction\n'
+                        '2,"Musing the metaverse",unavailable,Retraction\n'
+                        '3,"Metaverse or Metacurse?",10.1234/concern,Expression of concern\n'
+                        '4,"Introduction",10.1234/intro,Retraction\n'
+                        '5,"Editorial",unavailable,Retraction\n'
+                        '6,"Retraction notice",unavailable,Retraction\n')
+            retractions = RetractionIndex.from_csv(csv_path)
+
+        self.assertTrue(retractions.is_retracted("[1] E. Erler. Something else. Nature, 2006. doi:10.1038/NATURE04695.",
+                                                 "Something else"))
+        self.assertTrue(retractions.is_retracted("", "Lysyl oxidase is essential for hypoxia induced metastasis"))
+        self.assertFalse(retractions.is_retracted("", "Metaverse or Metacurse?"))
+        # generic titles need the DOI to match
+        for title in ["Introduction", "Editorial", "Retraction notice"]:
+            self.assertFalse(retractions.is_retracted(f"[1] A. Author. {title}. Some Journal, 2020.", title))
+        self.assertTrue(retractions.is_retracted("[1] A. Author. Introduction. doi:10.1234/intro", "Introduction"))
+
+        # retractions are flagged even when we only check links
+        checker = RefChecker(only_link_check=True, retractions=retractions)
+        results = checker.check_references([sanitize_ref(r) for r in self.test_references[12:14]])
+        self.assertNotIn(RETRACTED, results[0].problems)
+        self.assertIn(RETRACTED, results[1].problems)
+
+    def test_find_missing_authors(self):
+        item_authors = ["Wilbert Phillips-Mora", "Mike J. Wilkinson", "Nicolás J. Hernández Marcano", "Yi Li"]
+        cited = ["PhillipsMora", "Wilkinson", "Hernandez", "Marcano", "Li", "Mora", "kinson", "Smith", "Lee"]
+        # this is how authors were matched before the index, the index has to agree with it
+        expected = [a for a in cited if not any(a.lower() in just_the_chars(i).lower() for i in item_authors)]
+        self.assertEqual(["Smith", "Lee"], expected)
+        self.assertEqual(expected, find_missing_authors(cited, item_authors))
+        self.assertEqual(expected, find_missing_authors(cited, AuthorIndex(item_authors)))
+        self.assertEqual(["Smith"], find_missing_authors(["Smith"], []))
+        for name in ["Nicolás J. Hernández Marcano", "Jean-Luc O'Brien", "Ada Lovelace 2nd", "Ana ½ Tomé", "Zoë Ĳssel"]:
+            self.assertEqual(just_the_chars(name).lower(), "".join(AuthorIndex.split_name(name)))
+
+        # just_the_chars drops digits, so make up names out of letters
+        names = [f"{a}{b}{c}" for a in "ABCDEFGHIJ" for b in "abcdefghij" for c in "klmnopqrst"]
+        big_collaboration = BibResult("A Big Paper", "2012", [f"Ann {name}zyk" for name in names], "Physics", False)
+        self.assertIs(big_collaboration.author_index, big_collaboration.author_index)
+        self.assertEqual(["Smith"], find_missing_authors(["Jjtzyk", "Aak", "Smith"], big_collaboration.author_index))
+
+    def test_find_pdfs(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            papers = {"1.pdf": b"%PDF one", "sub/2.pdf": b"%PDF two", "notes.txt": b"not a pdf"}
+            zip_path = os.path.join(tmpdir, "papers.zip")
+            with zipfile.ZipFile(zip_path, 'w') as archive:
+                for name, data in papers.items():
+                    archive.writestr(name, data)
+            tar_path = os.path.join(tmpdir, "papers.tar.gz")
+            with tarfile.open(tar_path, 'w:gz') as archive:
+                for name, data in papers.items():
+                    path = os.path.join(tmpdir, name.replace("/", "_"))
+                    with open(path, 'wb') as f:
+                        f.write(data)
+                    archive.add(path, arcname=name)
+            list_path = os.path.join(tmpdir, "list.txt")
+            with open(list_path, 'w') as f:
+                f.write(f"{zip_path}\n\n{os.path.join(tmpdir, '1.pdf')}\n")
+
+            expected = [(f"{zip_path}:1.pdf", b"%PDF one"), (f"{zip_path}:sub/2.pdf", b"%PDF two")]
+            self.assertEqual(expected, list(find_pdfs(zip_path)))
+            self.assertEqual([(f"{tar_path}:1.pdf", b"%PDF one"), (f"{tar_path}:sub/2.pdf", b"%PDF two")],
+                             list(find_pdfs(tar_path)))
+            self.assertEqual(expected + [(os.path.join(tmpdir, '1.pdf'),) * 2], list(find_pdfs(list_path, True)))
+            # a PDF lands in the same shard whether it is in an archive or not
+            self.assertEqual(in_shard(os.path.join(tmpdir, '1.pdf'), (0, 3)), in_shard(b"%PDF one", (0, 3)))
+
+    @staticmethod
+    def make_pdf(lines):
+        doc = fitz.open()
+        page = doc.new_page()
+        for i, line in enumerate(lines):
+            page.insert_text((50, 50 + 15 * i), line, fontsize=8)
+        return doc.tobytes()
+
+    def test_check_skips_broken_pdfs(self):
+        pdf = self.make_pdf(["References", "[1] A. Author, \"A Paper About Nothing,\" Some Journal, 2020."])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            zip_path = os.path.join(tmpdir, "papers.zip")
+            with zipfile.ZipFile(zip_path, 'w') as archive:
+                archive.writestr("1.pdf", b"%PDF garbage")
+                archive.writestr("2.pdf", pdf)
+            result = CliRunner().invoke(main, ['check', '--dump-info', zip_path])
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertIn(f"Extracting references from: {zip_path}:2.pdf\nFound 1 references.", result.output)
+
+        checked = list(RefChecker(only_link_check=True).check_pdfs([("1.pdf", b"%PDF garbage"), ("2.pdf", pdf)]))
+        self.assertEqual(["2.pdf"], [pdf_result.path for pdf_result in checked])
+        self.assertEqual(1, len(checked[0].references))
+
+    def test_sharded_check_and_merge(self):
+        runner = CliRunner()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            pdf_dir = os.path.join(tmpdir, "pdfs")
+            os.mkdir(pdf_dir)
+            for i in range(6):
+                with open(os.path.join(pdf_dir, f"{i}.pdf"), 'wb') as f:
+                    f.write(self.make_pdf(["References", f"[1] A. Author, Paper {i}, http://paper{i}.invalid/{i}.pdf",
+                                           f"[2] B. Author, Notes {i}, 2020."]))
+
+            runs = []
+
+            def check(*args):
+                runs.append(args)
+                json_path = os.path.join(tmpdir, f"{len(runs)}.json")
+                result = runner.invoke(main, list(args) + ['--only-link-check', '--json-output', json_path, pdf_dir])
+                self.assertEqual(0, result.exit_code, result.output)
+                return json_path
+
+            def json_lines(json_path):
+                with open(json_path) as f:
+                    return sorted(f)
+
+            unsharded = check('check')
+            # more shards than PDFs, so some of them are empty
+            shards = [check('check', '--shard', f'{i}/8') for i in range(8)]
+            merged = os.path.join(tmpdir, "merged.json")
+            result = runner.invoke(main, ['merge', '--json-output', merged] + shards)
+            self.assertEqual(0, result.exit_code, result.output)
+            self.assertIn("Checked 6 PDFs with 12 references, 6 references have problems.", result.output)
+            self.assertEqual(6, len(json_lines(unsharded)))
+            self.assertEqual(json_lines(unsharded), json_lines(merged))
+            self.assertEqual(6, sum(len(json_lines(shard)) for shard in shards))
+
+            # check is what runs when no command is given
+            self.assertEqual(json_lines(unsharded), json_lines(check()))
+
+        result = runner.invoke(main, ['--help'])
+        self.assertEqual(0, result.exit_code)
+        self.assertIn("refcheck.py check --help", result.output)
+        self.assertIn("--shard", runner.invoke(main, ['check', '--help']).output)
+
+    def test_pdfs_from_stdin(self):
+        class Trickle(io.RawIOBase):
+            # a pipe that only has one byte ready at a time
+            def __init__(self, data):
+                self.data = data
+
+            def readable(self):
+                return True
+
+            def readinto(self, b):
+                if not self.data:
+                    return 0
+                b[0], self.data = self.data[0], self.data[1:]
+                return 1
+
+        def stdin(data):
+            return io.BufferedReader(Trickle(data))
+
+        self.assertEqual([('-', b"%PDF one")], list(pdfs_from_stdin(stdin(b"%PDF one"))))
+
+        zip_bytes = io.BytesIO()
+        with zipfile.ZipFile(zip_bytes, 'w') as archive:
+            archive.writestr("1.pdf", b"%PDF one")
+            archive.writestr("2.pdf", b"%PDF two")
+        self.assertEqual([("-:1.pdf", b"%PDF one"), ("-:2.pdf", b"%PDF two")],
+                         list(pdfs_from_stdin(stdin(zip_bytes.getvalue()))))
+        # a member that fails its CRC check is skipped
+        self.assertEqual([("-:2.pdf", b"%PDF two")],
+                         list(pdfs_from_stdin(stdin(zip_bytes.getvalue().replace(b"%PDF one", b"%PDF ONE")))))
+
+        tar_bytes = io.BytesIO()
+        with tarfile.open(fileobj=tar_bytes, mode='w:gz') as archive:
+            info = tarfile.TarInfo("1.pdf")
+            info.size = 8
+            archive.addfile(info, io.BytesIO(b"%PDF one"))
+        self.assertEqual([("-:1.pdf", b"%PDF one")], list(pdfs_from_stdin(stdin(tar_bytes.getvalue()))))
+
+        for junk in [b"", b"no", b"this is not a PDF or an archive"]:
+            with self.assertRaises(click.UsageError):
+                list(pdfs_from_stdin(stdin(junk)))
+
 
 if __name__ == '__main__':
     unittest.main()